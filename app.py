@@ -15,26 +15,35 @@ import io
 import logging
 import os
 import sqlite3
-import uuid
-from datetime import datetime
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional, Tuple
 
 # Third-party imports
+import click
 from flask import Flask, flash, redirect, render_template, request, send_file, url_for
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.platypus import Paragraph, SimpleDocTemplate, Table, TableStyle
+from werkzeug.routing import BaseConverter
 
 # Local imports
 from database import (
-    get_all_locations,
-    get_all_products,
+    DELETE_LOCATION_SQL,
+    DELETE_PRODUCT_SQL,
+    INSERT_LOCATION_SQL,
+    INSERT_PRODUCT_SQL,
+    UPDATE_LOCATION_SQL,
+    UPDATE_PRODUCT_SQL,
+    bulk_add_movements,
     get_db,
     get_inventory_report,
-    get_recent_movements,
-    init_db,
-    populate_initial_data
+    ensure_schema,
+    invalidate_catalog_cache,
+    load_dashboard_bundle
 )
 
 # ============================================================================
@@ -48,10 +57,26 @@ class Config:
     HOST = os.environ.get('FLASK_HOST', '127.0.0.1')
     PORT = int(os.environ.get('FLASK_PORT', 5000))
 
+# PDF reports larger than this are spooled to a temporary file on disk
+PDF_SPOOL_MAX_SIZE = 1 << 20
+
+# Number of generated PDF reports kept in memory for repeat downloads
+PDF_CACHE_SIZE = 8
+
 # ============================================================================
 # APPLICATION FACTORY
 # ============================================================================
 
+class RecordIdConverter(BaseConverter):
+    """
+    URL converter for product and location ids.
+    
+    Matches the id shapes the app generates (dashed or plain hex UUIDs and
+    the short seed ids such as 'p1'), so malformed ids are rejected with a
+    404 at routing time instead of reaching the database.
+    """
+    regex = r'[A-Za-z0-9-]{1,36}'
+
 def create_app(config_class=Config) -> Flask:
     """
     Create and configure the Flask application.
@@ -64,21 +89,33 @@ def create_app(config_class=Config) -> Flask:
     """
     app = Flask(__name__)
     app.config.from_object(config_class)
+    app.url_map.converters['record_id'] = RecordIdConverter
     
     # Configure logging
     if not app.debug:
         logging.basicConfig(level=logging.INFO)
     
-    # Initialize database when the app starts
-    with app.app_context():
-        # Database initialization happens on import
-        pass
+    # Templates only change on deploy outside of debug mode
+    if not app.debug:
+        app.config['TEMPLATES_AUTO_RELOAD'] = False
+        app.jinja_env.auto_reload = False
+    
+    # Schema setup runs once per deployment, not on every import
+    @app.cli.command('init-db')
+    def init_db_command() -> None:
+        """Create or upgrade the database schema."""
+        ensure_schema()
+        click.echo('Database schema is up to date.')
     
     return app
 
 # Create application instance
 app = create_app()
 
+# Every page renders the same template, so compile it once up front.
+# Debug mode keeps the name lookup so template edits are still picked up.
+INDEX_TEMPLATE = 'index.html' if app.debug else app.jinja_env.get_template('index.html')
+
 # ============================================================================
 # UTILITY FUNCTIONS
 # ============================================================================
@@ -126,22 +163,12 @@ def index() -> str:
         Rendered HTML template for the inventory report
     """
     try:
-        report_data = get_inventory_report()
-        products = get_all_products()
-        locations = get_all_locations()
-        movements = get_recent_movements()
-
-        return render_template(
-            'index.html', 
-            active_page='report',
-            report_data=report_data,
-            products=products,
-            locations=locations,
-            movements=movements
-        )
+        bundle = load_dashboard_bundle(include_report=True)
+
+        return render_template(INDEX_TEMPLATE, active_page='report', **bundle)
     except Exception as e:
         handle_database_error('loading dashboard', e)
-        return render_template('index.html', active_page='report')
+        return render_template(INDEX_TEMPLATE, active_page='report')
 
 # ============================================================================
 # PRODUCT MANAGEMENT ROUTES
@@ -156,20 +183,12 @@ def products_view() -> str:
         Rendered HTML template for product management
     """
     try:
-        products = get_all_products()
-        locations = get_all_locations()
-        movements = get_recent_movements()
+        bundle = load_dashboard_bundle()
         
-        return render_template(
-            'index.html', 
-            active_page='products',
-            products=products,
-            locations=locations,
-            movements=movements
-        )
+        return render_template(INDEX_TEMPLATE, active_page='products', **bundle)
     except Exception as e:
         handle_database_error('loading products', e)
-        return render_template('index.html', active_page='products')
+        return render_template(INDEX_TEMPLATE, active_page='products')
 
 @app.route('/products/add', methods=['POST'])
 def add_product() -> str:
@@ -186,12 +205,10 @@ def add_product() -> str:
     
     try:
         with get_db() as db:
-            product_id = str(uuid.uuid4())
-            db.execute(
-                "INSERT INTO Product (product_id, name) VALUES (?, ?)", 
-                (product_id, name)
-            )
+            # SQLite generates the primary key and hands it back
+            product_id = db.execute(INSERT_PRODUCT_SQL, (name,)).fetchone()['product_id']
             db.commit()
+            invalidate_catalog_cache()
             flash(f'Product "{name}" added successfully!', 'success')
             app.logger.info(f'Added new product: {name} (ID: {product_id})')
     except Exception as e:
@@ -199,7 +216,7 @@ def add_product() -> str:
 
     return redirect(url_for('products_view'))
 
-@app.route('/products/edit/<product_id>', methods=['POST'])
+@app.route('/products/edit/<record_id:product_id>', methods=['POST'])
 def edit_product(product_id: str) -> str:
     """
     Handle editing an existing product.
@@ -217,28 +234,22 @@ def edit_product(product_id: str) -> str:
     
     try:
         with get_db() as db:
-            # Verify product exists
-            product = db.execute(
-                "SELECT * FROM Product WHERE product_id = ?", 
-                (product_id,)
-            ).fetchone()
+            # A missing product simply updates no rows, so nothing is returned
+            product = db.execute(UPDATE_PRODUCT_SQL, (name, product_id)).fetchone()
             
             if not product:
                 flash('Product not found.', 'error')
             else:
-                db.execute(
-                    "UPDATE Product SET name = ? WHERE product_id = ?", 
-                    (name, product_id)
-                )
                 db.commit()
+                invalidate_catalog_cache()
                 flash(f'Product updated to "{name}" successfully!', 'success')
-                app.logger.info(f'Updated product {product_id}: {product["name"]} -> {name}')
+                app.logger.info(f'Updated product {product_id} -> {name}')
     except Exception as e:
         handle_database_error('updating product', e)
     
     return redirect(url_for('products_view'))
 
-@app.route('/products/delete/<product_id>', methods=['POST'])
+@app.route('/products/delete/<record_id:product_id>', methods=['POST'])
 def delete_product(product_id: str) -> str:
     """
     Handle deleting a product.
@@ -251,31 +262,26 @@ def delete_product(product_id: str) -> str:
     """
     try:
         with get_db() as db:
-            # Verify product exists
-            product = db.execute(
-                "SELECT * FROM Product WHERE product_id = ?", 
-                (product_id,)
-            ).fetchone()
+            # Movements referencing the product make the FOREIGN KEY reject this
+            product = db.execute(DELETE_PRODUCT_SQL, (product_id,)).fetchone()
             
             if not product:
                 flash('Product not found.', 'error')
             else:
-                # Check for movement history
-                movements = db.execute(
-                    "SELECT COUNT(*) as count FROM ProductMovement WHERE product_id = ?", 
-                    (product_id,)
-                ).fetchone()
-                
-                if movements['count'] > 0:
-                    flash(
-                        f'Cannot delete product "{product["name"]}" because it has movement history.', 
-                        'error'
-                    )
-                else:
-                    db.execute("DELETE FROM Product WHERE product_id = ?", (product_id,))
-                    db.commit()
-                    flash(f'Product "{product["name"]}" deleted successfully!', 'success')
-                    app.logger.info(f'Deleted product: {product["name"]} (ID: {product_id})')
+                db.commit()
+                invalidate_catalog_cache()
+                flash(f'Product "{product["name"]}" deleted successfully!', 'success')
+                app.logger.info(f'Deleted product: {product["name"]} (ID: {product_id})')
+    except sqlite3.IntegrityError:
+        # Only this rare path needs the name, so it is looked up here
+        with get_db() as db:
+            product = db.execute(
+                "SELECT name FROM Product WHERE product_id = ?", (product_id,)
+            ).fetchone()
+        flash(
+            f'Cannot delete product "{product["name"]}" because it has movement history.', 
+            'error'
+        )
     except Exception as e:
         handle_database_error('deleting product', e)
     
@@ -294,20 +300,12 @@ def locations_view() -> str:
         Rendered HTML template for location management
     """
     try:
-        products = get_all_products()
-        locations = get_all_locations()
-        movements = get_recent_movements()
+        bundle = load_dashboard_bundle()
         
-        return render_template(
-            'index.html', 
-            active_page='locations',
-            products=products,
-            locations=locations,
-            movements=movements
-        )
+        return render_template(INDEX_TEMPLATE, active_page='locations', **bundle)
     except Exception as e:
         handle_database_error('loading locations', e)
-        return render_template('index.html', active_page='locations')
+        return render_template(INDEX_TEMPLATE, active_page='locations')
 
 @app.route('/locations/add', methods=['POST'])
 def add_location() -> str:
@@ -324,12 +322,10 @@ def add_location() -> str:
     
     try:
         with get_db() as db:
-            location_id = str(uuid.uuid4())
-            db.execute(
-                "INSERT INTO Location (location_id, name) VALUES (?, ?)", 
-                (location_id, name)
-            )
+            # SQLite generates the primary key and hands it back
+            location_id = db.execute(INSERT_LOCATION_SQL, (name,)).fetchone()['location_id']
             db.commit()
+            invalidate_catalog_cache()
             flash(f'Location "{name}" added successfully!', 'success')
             app.logger.info(f'Added new location: {name} (ID: {location_id})')
     except Exception as e:
@@ -337,7 +333,7 @@ def add_location() -> str:
 
     return redirect(url_for('locations_view'))
 
-@app.route('/locations/edit/<location_id>', methods=['POST'])
+@app.route('/locations/edit/<record_id:location_id>', methods=['POST'])
 def edit_location(location_id: str) -> str:
     """
     Handle editing an existing location.
@@ -355,28 +351,22 @@ def edit_location(location_id: str) -> str:
     
     try:
         with get_db() as db:
-            # Verify location exists
-            location = db.execute(
-                "SELECT * FROM Location WHERE location_id = ?", 
-                (location_id,)
-            ).fetchone()
+            # A missing location simply updates no rows, so nothing is returned
+            location = db.execute(UPDATE_LOCATION_SQL, (name, location_id)).fetchone()
             
             if not location:
                 flash('Location not found.', 'error')
             else:
-                db.execute(
-                    "UPDATE Location SET name = ? WHERE location_id = ?", 
-                    (name, location_id)
-                )
                 db.commit()
+                invalidate_catalog_cache()
                 flash(f'Location updated to "{name}" successfully!', 'success')
-                app.logger.info(f'Updated location {location_id}: {location["name"]} -> {name}')
+                app.logger.info(f'Updated location {location_id} -> {name}')
     except Exception as e:
         handle_database_error('updating location', e)
     
     return redirect(url_for('locations_view'))
 
-@app.route('/locations/delete/<location_id>', methods=['POST'])
+@app.route('/locations/delete/<record_id:location_id>', methods=['POST'])
 def delete_location(location_id: str) -> str:
     """
     Handle deleting a location.
@@ -389,31 +379,26 @@ def delete_location(location_id: str) -> str:
     """
     try:
         with get_db() as db:
-            # Verify location exists
-            location = db.execute(
-                "SELECT * FROM Location WHERE location_id = ?", 
-                (location_id,)
-            ).fetchone()
+            # Movements referencing the location make the FOREIGN KEY reject this
+            location = db.execute(DELETE_LOCATION_SQL, (location_id,)).fetchone()
             
             if not location:
                 flash('Location not found.', 'error')
             else:
-                # Check for movement history
-                movements = db.execute(
-                    "SELECT COUNT(*) as count FROM ProductMovement WHERE from_location = ? OR to_location = ?", 
-                    (location_id, location_id)
-                ).fetchone()
-                
-                if movements['count'] > 0:
-                    flash(
-                        f'Cannot delete location "{location["name"]}" because it has movement history.', 
-                        'error'
-                    )
-                else:
-                    db.execute("DELETE FROM Location WHERE location_id = ?", (location_id,))
-                    db.commit()
-                    flash(f'Location "{location["name"]}" deleted successfully!', 'success')
-                    app.logger.info(f'Deleted location: {location["name"]} (ID: {location_id})')
+                db.commit()
+                invalidate_catalog_cache()
+                flash(f'Location "{location["name"]}" deleted successfully!', 'success')
+                app.logger.info(f'Deleted location: {location["name"]} (ID: {location_id})')
+    except sqlite3.IntegrityError:
+        # Only this rare path needs the name, so it is looked up here
+        with get_db() as db:
+            location = db.execute(
+                "SELECT name FROM Location WHERE location_id = ?", (location_id,)
+            ).fetchone()
+        flash(
+            f'Cannot delete location "{location["name"]}" because it has movement history.', 
+            'error'
+        )
     except Exception as e:
         handle_database_error('deleting location', e)
     
@@ -432,20 +417,12 @@ def movements_view() -> str:
         Rendered HTML template for movement management
     """
     try:
-        products = get_all_products()
-        locations = get_all_locations()
-        movements = get_recent_movements()
+        bundle = load_dashboard_bundle()
         
-        return render_template(
-            'index.html', 
-            active_page='movements',
-            products=products,
-            locations=locations,
-            movements=movements
-        )
+        return render_template(INDEX_TEMPLATE, active_page='movements', **bundle)
     except Exception as e:
         handle_database_error('loading movements', e)
-        return render_template('index.html', active_page='movements')
+        return render_template(INDEX_TEMPLATE, active_page='movements')
 
 @app.route('/movements/add', methods=['POST'])
 def add_movement() -> str:
@@ -491,14 +468,9 @@ def add_movement() -> str:
         return redirect(url_for('movements_view'))
         
     try:
-        with get_db() as db:
-            db.execute(
-                "INSERT INTO ProductMovement (timestamp, from_location, to_location, product_id, qty) VALUES (?, ?, ?, ?, ?)",
-                (datetime.now(), from_location_db, to_location_db, product_id, qty)
-            )
-            db.commit()
-            flash('Movement recorded successfully!', 'success')
-            app.logger.info(f'Recorded movement: Product {product_id}, Qty {qty}, From {from_location_db}, To {to_location_db}')
+        bulk_add_movements([(from_location_db, to_location_db, product_id, qty)])
+        flash('Movement recorded successfully!', 'success')
+        app.logger.info(f'Recorded movement: Product {product_id}, Qty {qty}, From {from_location_db}, To {to_location_db}')
     except Exception as e:
         handle_database_error('recording movement', e)
 
@@ -508,6 +480,86 @@ def add_movement() -> str:
 # REPORTING ROUTES
 # ============================================================================
 
+# PDF builds run on a small dedicated pool so a burst of downloads cannot
+# occupy every request thread with ReportLab layout work
+_pdf_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='pdf-report')
+
+# Report styles never change, so build them once instead of per download
+_REPORT_STYLES = getSampleStyleSheet()
+_REPORT_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#4CAF50")),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+])
+
+# Recently generated PDFs keyed by the report contents they were built from
+_pdf_cache: 'OrderedDict[Tuple, bytes]' = OrderedDict()
+_pdf_cache_lock = threading.Lock()
+
+def report_cache_key(report_data: List) -> Tuple:
+    """
+    Compute a cache key for a PDF built from the given report rows.
+    
+    Args:
+        report_data: Rows returned by get_inventory_report()
+        
+    Returns:
+        Hashable snapshot of the report contents
+    """
+    return tuple(tuple(row) for row in report_data)
+
+def build_report_pdf(report_data: List) -> tempfile.SpooledTemporaryFile:
+    """
+    Render the inventory report rows into a PDF document.
+    
+    Args:
+        report_data: Non-empty rows returned by get_inventory_report()
+        
+    Returns:
+        Spooled file holding the PDF, rewound to the start
+    """
+    # Build the PDF into a spooled file: kept in memory for typical
+    # reports, moved to disk once it outgrows PDF_SPOOL_MAX_SIZE
+    pdf_file = tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_SIZE)
+    doc = SimpleDocTemplate(pdf_file, pagesize=letter)
+    elements = []
+
+    # Add title. Flowables keep layout state, so this one is built per document.
+    title = Paragraph("📊 Inventory Report", _REPORT_STYLES['Title'])
+    elements.append(title)
+
+    # Prepare table data
+    first_row = report_data[0]
+    if hasattr(first_row, 'keys'):
+        columns = list(first_row.keys())
+    else:
+        # Fallback for tuple/list data
+        num_cols = len(first_row)
+        columns = [f"Column {i+1}" for i in range(num_cols)]
+    
+    # sqlite3.Row iterates its values in column order, so cells are read
+    # positionally instead of looking each one up by column name
+    table_data = [columns]
+    table_data.extend([list(map(str, row)) for row in report_data])
+
+    # Create and style table
+    table = Table(table_data, hAlign='LEFT')
+    table.setStyle(_REPORT_TABLE_STYLE)
+    elements.append(table)
+
+    # Build PDF
+    try:
+        doc.build(elements)
+    except Exception:
+        pdf_file.close()
+        raise
+    pdf_file.seek(0)
+    return pdf_file
+
 @app.route('/report/download', methods=['GET'])
 def download_report() -> str:
     """
@@ -523,47 +575,33 @@ def download_report() -> str:
             flash("No data available to generate PDF.", "error")
             return redirect(url_for("index"))
 
-        # Create PDF in memory
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        elements = []
-
-        # Add title
-        styles = getSampleStyleSheet()
-        title = Paragraph("📊 Inventory Report", styles['Title'])
-        elements.append(title)
-
-        # Prepare table data
-        first_row = report_data[0]
-        if hasattr(first_row, 'keys'):
-            columns = list(first_row.keys())
-            table_data = [columns] + [[str(row[col]) for col in columns] for row in report_data]
-        else:
-            # Fallback for tuple/list data
-            num_cols = len(first_row)
-            columns = [f"Column {i+1}" for i in range(num_cols)]
-            table_data = [columns] + [list(map(str, row)) for row in report_data]
-
-        # Create and style table
-        table = Table(table_data, hAlign='LEFT')
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#4CAF50")),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ]))
-        elements.append(table)
-
-        # Build PDF
-        doc.build(elements)
-        buffer.seek(0)
+        cache_key = report_cache_key(report_data)
+        with _pdf_cache_lock:
+            pdf_bytes = _pdf_cache.get(cache_key)
+            if pdf_bytes is not None:
+                _pdf_cache.move_to_end(cache_key)
 
-        app.logger.info('Generated PDF inventory report')
+        if pdf_bytes is not None:
+            pdf_file = io.BytesIO(pdf_bytes)
+        else:
+            pdf_file = _pdf_executor.submit(build_report_pdf, report_data).result()
+            app.logger.info('Generated PDF inventory report')
+
+            # Cache reports that stayed in memory; larger ones are streamed as-is
+            size = pdf_file.seek(0, io.SEEK_END)
+            pdf_file.seek(0)
+            if size <= PDF_SPOOL_MAX_SIZE:
+                pdf_bytes = pdf_file.read()
+                pdf_file.close()
+                with _pdf_cache_lock:
+                    _pdf_cache[cache_key] = pdf_bytes
+                    while len(_pdf_cache) > PDF_CACHE_SIZE:
+                        _pdf_cache.popitem(last=False)
+                pdf_file = io.BytesIO(pdf_bytes)
+
+        # send_file streams the file in blocks and closes it when done
         return send_file(
-            buffer,
+            pdf_file,
             as_attachment=True,
             download_name="inventory_report.pdf",
             mimetype="application/pdf"
@@ -595,8 +633,10 @@ def internal_error(error):
 
 if __name__ == '__main__':
     """Run the Flask application."""
+    ensure_schema()
     app.run(
         debug=Config.DEBUG,
         host=Config.HOST,
-        port=Config.PORT
+        port=Config.PORT,
+        threaded=True
     )
\ No newline at end of file
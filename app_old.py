@@ -1,86 +1,120 @@
 # Flask and standard library imports
-from flask import Flask, render_template, request, redirect, url_for, flash, send_file
+from flask import Flask, render_template, request, redirect, url_for, flash, send_file, g
 import sqlite3
-import io
 import csv
-import uuid
-from datetime import datetime
+import tempfile
+from itertools import chain
 
 # Third-party imports
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet
+from jinja2 import FileSystemBytecodeCache
 
 # Local imports
 from database import (
-    get_all_products, get_all_locations, get_recent_movements, 
-    get_inventory_report, get_db, init_db, populate_initial_data
+    get_inventory_report_iter, ensure_schema, load_dashboard_bundle,
+    invalidate, acquire_connection, release_connection, INSERT_PRODUCT_SQL,
+    UPDATE_PRODUCT_SQL, DELETE_PRODUCT_SQL, INSERT_LOCATION_SQL, UPDATE_LOCATION_SQL,
+    DELETE_LOCATION_SQL, INSERT_MOVEMENT_SQL
 )
 
 app = Flask(__name__)
 app.secret_key = 'super_secret_key_for_flash' # Required for flash messages
 
-# Initialize DB when the app starts
+# Keep compiled template bytecode on disk (per-user temp dir) so restarts
+# skip parsing. Outside debug mode templates don't change while the app runs,
+# so skip the mtime checks too; TEMPLATES_AUTO_RELOAD is left unset so that
+# app.run(debug=True) switches reloading back on.
+if not app.debug:
+    app.jinja_env.auto_reload = False
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache()
+
 with app.app_context():
-    # init_db() and populate_initial_data() are called on database.py import
-    pass
+    # Compile every template now so the first request doesn't pay for it
+    for template_name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(template_name)
+
+# PDF report styles, built once and shared by every download
+_STYLES = getSampleStyleSheet()
+_TITLE_STYLE = _STYLES['Title']
+_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0,0), (-1,0), colors.HexColor("#4CAF50")),
+    ('TEXTCOLOR', (0,0), (-1,0), colors.whitesmoke),
+    ('ALIGN', (0,0), (-1,-1), 'CENTER'),
+    ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+    ('BOTTOMPADDING', (0,0), (-1,0), 12),
+    ('BACKGROUND', (0,1), (-1,-1), colors.beige),
+    ('GRID', (0,0), (-1,-1), 1, colors.black),
+])
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Creates or upgrades the database schema (`flask --app app_old init-db`)."""
+    ensure_schema()
+    print('Database schema is up to date.')
+
+def get_request_db():
+    """Returns this request's connection, taking one from the pool on first use."""
+    if 'db' not in g:
+        g.db = acquire_connection()
+    return g.db
+
+@app.teardown_appcontext
+def release_request_db(exception):
+    """Hands the request's connection back to the pool."""
+    db = g.pop('db', None)
+    if db is not None:
+        release_connection(db)
+
+def add_failed(message, status, view):
+    """Reports a failed add: an error fragment for HTMX, otherwise flash and redirect."""
+    if request.headers.get('HX-Request'):
+        # Redirecting would make HTMX swap a whole page into the list
+        return render_template('partials/alert.html', category='error', message=message), status
+    flash(message, 'error')
+    return redirect(url_for(view))
 
 @app.route('/')
 def index():
     """Renders the main index page (Inventory Report)."""
-    # Fetch report data using the new SQLite function
-    report_data = get_inventory_report()
-    
-    # Fetch data for dropdowns (even though this page only shows the report)
-    products = get_all_products()
-    locations = get_all_locations()
-    movements = get_recent_movements()
-
-    return render_template(
-        'index.html', 
-        active_page='report',
-        report_data=report_data,
-        products=products,
-        locations=locations,
-        movements=movements
-    )
+    # Report plus the data for dropdowns (even though this page only shows
+    # the report), fetched together; only uncached queries hit the database
+    bundle = load_dashboard_bundle(include_report=True, db=get_request_db())
+
+    return render_template('index.html', active_page='report', **bundle)
 
 # --- CRUD Routes for Products ---
 
 @app.route('/products', methods=['GET'])
 def products_view():
     """Renders the Products management page."""
-    products = get_all_products()
-    locations = get_all_locations()
-    movements = get_recent_movements()
+    bundle = load_dashboard_bundle(db=get_request_db())
     
-    # Render with necessary data, passing only products list
-    return render_template(
-        'index.html', 
-        active_page='products',
-        products=products,
-        locations=locations,
-        movements=movements
-    )
+    return render_template('index.html', active_page='products', **bundle)
 
 @app.route('/products/add', methods=['POST'])
 def add_product():
     """Handles adding a new product."""
     name = request.form.get('name').strip()
     if not name:
-        flash('Product name cannot be empty.', 'error')
-    else:
-        try:
-            with get_db() as db:
-                product_id = str(uuid.uuid4())  # Generate UUID for primary key
-                db.execute("INSERT INTO Product (product_id, name) VALUES (?, ?)", (product_id, name))
-                db.commit()
-                flash(f'Product "{name}" added successfully!', 'success')
-        except sqlite3.IntegrityError:
-            flash(f'Error: Product name "{name}" already exists.', 'error')
-        except Exception as e:
-            flash(f'An error occurred while adding product: {e}', 'error')
+        return add_failed('Product name cannot be empty.', 400, 'products_view')
+
+    try:
+        with get_request_db() as db:
+            # SQLite generates the primary key and hands it back
+            product_id = db.execute(INSERT_PRODUCT_SQL, (name,)).fetchone()['product_id']
+            db.commit()
+            invalidate('Product')
+            if request.headers.get('HX-Request'):
+                # HTMX request: send back only the new row for the list
+                return render_template('partials/product_row.html', p={'product_id': product_id, 'name': name})
+            flash(f'Product "{name}" added successfully!', 'success')
+    except sqlite3.IntegrityError:
+        return add_failed(f'Error: Product name "{name}" already exists.', 409, 'products_view')
+    except Exception as e:
+        return add_failed(f'An error occurred while adding product: {e}', 500, 'products_view')
 
     return redirect(url_for('products_view'))
 
@@ -92,15 +126,15 @@ def edit_product(product_id):
         flash('Product name cannot be empty.', 'error')
     else:
         try:
-            with get_db() as db:
-                # Check if product exists
-                product = db.execute("SELECT * FROM Product WHERE product_id = ?", (product_id,)).fetchone()
+            with get_request_db() as db:
+                # No row comes back if the product doesn't exist
+                product = db.execute(UPDATE_PRODUCT_SQL, (name, product_id)).fetchone()
                 if not product:
                     flash('Product not found.', 'error')
                 else:
-                    db.execute("UPDATE Product SET name = ? WHERE product_id = ?", (name, product_id))
                     db.commit()
-                    flash(f'Product updated to "{name}" successfully!', 'success')
+                    invalidate('Product')
+                    flash(f'Product updated to "{product["name"]}" successfully!', 'success')
         except sqlite3.IntegrityError:
             flash(f'Error: Product name "{name}" already exists.', 'error')
         except Exception as e:
@@ -112,20 +146,19 @@ def edit_product(product_id):
 def delete_product(product_id):
     """Handles deleting a product."""
     try:
-        with get_db() as db:
-            # Check if product exists
-            product = db.execute("SELECT * FROM Product WHERE product_id = ?", (product_id,)).fetchone()
+        with get_request_db() as db:
+            # Movements referencing the product make the FOREIGN KEY reject this
+            product = db.execute(DELETE_PRODUCT_SQL, (product_id,)).fetchone()
             if not product:
                 flash('Product not found.', 'error')
             else:
-                # Check if product is used in any movements
-                movements = db.execute("SELECT COUNT(*) as count FROM ProductMovement WHERE product_id = ?", (product_id,)).fetchone()
-                if movements['count'] > 0:
-                    flash(f'Cannot delete product "{product["name"]}" because it has movement history.', 'error')
-                else:
-                    db.execute("DELETE FROM Product WHERE product_id = ?", (product_id,))
-                    db.commit()
-                    flash(f'Product "{product["name"]}" deleted successfully!', 'success')
+                db.commit()
+                invalidate('Product')
+                flash(f'Product "{product["name"]}" deleted successfully!', 'success')
+    except sqlite3.IntegrityError:
+        # Only this rare path needs the name, so it is looked up here
+        product = get_request_db().execute("SELECT name FROM Product WHERE product_id = ?", (product_id,)).fetchone()
+        flash(f'Cannot delete product "{product["name"]}" because it has movement history.', 'error')
     except Exception as e:
         flash(f'An error occurred while deleting product: {e}', 'error')
     
@@ -136,35 +169,31 @@ def delete_product(product_id):
 @app.route('/locations', methods=['GET'])
 def locations_view():
     """Renders the Locations management page."""
-    products = get_all_products()
-    locations = get_all_locations()
-    movements = get_recent_movements()
+    bundle = load_dashboard_bundle(db=get_request_db())
     
-    return render_template(
-        'index.html', 
-        active_page='locations',
-        products=products,
-        locations=locations,
-        movements=movements
-    )
+    return render_template('index.html', active_page='locations', **bundle)
 
 @app.route('/locations/add', methods=['POST'])
 def add_location():
     """Handles adding a new location."""
     name = request.form.get('name').strip()
     if not name:
-        flash('Location name cannot be empty.', 'error')
-    else:
-        try:
-            with get_db() as db:
-                location_id = str(uuid.uuid4()) # Generate UUID for primary key
-                db.execute("INSERT INTO Location (location_id, name) VALUES (?, ?)", (location_id, name))
-                db.commit()
-                flash(f'Location "{name}" added successfully!', 'success')
-        except sqlite3.IntegrityError:
-            flash(f'Error: Location name "{name}" already exists.', 'error')
-        except Exception as e:
-            flash(f'An error occurred while adding location: {e}', 'error')
+        return add_failed('Location name cannot be empty.', 400, 'locations_view')
+
+    try:
+        with get_request_db() as db:
+            # SQLite generates the primary key and hands it back
+            location_id = db.execute(INSERT_LOCATION_SQL, (name,)).fetchone()['location_id']
+            db.commit()
+            invalidate('Location')
+            if request.headers.get('HX-Request'):
+                # HTMX request: send back only the new row for the list
+                return render_template('partials/location_row.html', l={'location_id': location_id, 'name': name})
+            flash(f'Location "{name}" added successfully!', 'success')
+    except sqlite3.IntegrityError:
+        return add_failed(f'Error: Location name "{name}" already exists.', 409, 'locations_view')
+    except Exception as e:
+        return add_failed(f'An error occurred while adding location: {e}', 500, 'locations_view')
 
     return redirect(url_for('locations_view'))
 
@@ -176,15 +205,15 @@ def edit_location(location_id):
         flash('Location name cannot be empty.', 'error')
     else:
         try:
-            with get_db() as db:
-                # Check if location exists
-                location = db.execute("SELECT * FROM Location WHERE location_id = ?", (location_id,)).fetchone()
+            with get_request_db() as db:
+                # No row comes back if the location doesn't exist
+                location = db.execute(UPDATE_LOCATION_SQL, (name, location_id)).fetchone()
                 if not location:
                     flash('Location not found.', 'error')
                 else:
-                    db.execute("UPDATE Location SET name = ? WHERE location_id = ?", (name, location_id))
                     db.commit()
-                    flash(f'Location updated to "{name}" successfully!', 'success')
+                    invalidate('Location')
+                    flash(f'Location updated to "{location["name"]}" successfully!', 'success')
         except sqlite3.IntegrityError:
             flash(f'Error: Location name "{name}" already exists.', 'error')
         except Exception as e:
@@ -196,23 +225,19 @@ def edit_location(location_id):
 def delete_location(location_id):
     """Handles deleting a location."""
     try:
-        with get_db() as db:
-            # Check if location exists
-            location = db.execute("SELECT * FROM Location WHERE location_id = ?", (location_id,)).fetchone()
+        with get_request_db() as db:
+            # Movements referencing the location make the FOREIGN KEY reject this
+            location = db.execute(DELETE_LOCATION_SQL, (location_id,)).fetchone()
             if not location:
                 flash('Location not found.', 'error')
             else:
-                # Check if location is used in any movements
-                movements = db.execute(
-                    "SELECT COUNT(*) as count FROM ProductMovement WHERE from_location = ? OR to_location = ?", 
-                    (location_id, location_id)
-                ).fetchone()
-                if movements['count'] > 0:
-                    flash(f'Cannot delete location "{location["name"]}" because it has movement history.', 'error')
-                else:
-                    db.execute("DELETE FROM Location WHERE location_id = ?", (location_id,))
-                    db.commit()
-                    flash(f'Location "{location["name"]}" deleted successfully!', 'success')
+                db.commit()
+                invalidate('Location')
+                flash(f'Location "{location["name"]}" deleted successfully!', 'success')
+    except sqlite3.IntegrityError:
+        # Only this rare path needs the name, so it is looked up here
+        location = get_request_db().execute("SELECT name FROM Location WHERE location_id = ?", (location_id,)).fetchone()
+        flash(f'Cannot delete location "{location["name"]}" because it has movement history.', 'error')
     except Exception as e:
         flash(f'An error occurred while deleting location: {e}', 'error')
     
@@ -223,17 +248,9 @@ def delete_location(location_id):
 @app.route('/movements', methods=['GET'])
 def movements_view():
     """Renders the Movements page."""
-    products = get_all_products()
-    locations = get_all_locations()
-    movements = get_recent_movements()
+    bundle = load_dashboard_bundle(db=get_request_db())
     
-    return render_template(
-        'index.html', 
-        active_page='movements',
-        products=products,
-        locations=locations,
-        movements=movements
-    )
+    return render_template('index.html', active_page='movements', **bundle)
 
 @app.route('/movements/add', methods=['POST'])
 def add_movement():
@@ -271,12 +288,14 @@ def add_movement():
         return redirect(url_for('movements_view'))
         
     try:
-        with get_db() as db:
+        with get_request_db() as db:
+            # SQLite stamps the movement itself
             db.execute(
-                "INSERT INTO ProductMovement (timestamp, from_location, to_location, product_id, qty) VALUES (?, ?, ?, ?, ?)",
-                (datetime.now(), from_location_db, to_location_db, product_id, qty)
+                INSERT_MOVEMENT_SQL,
+                (from_location_db, to_location_db, product_id, qty)
             )
             db.commit()
+            invalidate('ProductMovement')
             flash('Movement recorded successfully!', 'success')
     except Exception as e:
         flash(f'An error occurred while recording movement: {e}', 'error')
@@ -288,54 +307,53 @@ def download_report():
     Generate a PDF of the overall inventory report and send it
     as a file download.
     """
-    report_data = get_inventory_report()
+    # Stream rows from the cursor; peek at the first for the column names
+    report_rows = get_inventory_report_iter()
+    first = next(report_rows, None)
 
-    if not report_data:
+    if first is None:
+        report_rows.close()
         flash("No data available to generate PDF.", "error")
         return redirect(url_for("index"))
+    report_rows = chain([first], report_rows)
 
-    # --- Prepare PDF in memory ---
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    # --- Prepare PDF in a spooled file (spills to disk past 1 MiB) ---
+    pdf_file = tempfile.SpooledTemporaryFile(max_size=1 << 20)
+    doc = SimpleDocTemplate(pdf_file, pagesize=letter)
     elements = []
 
-    styles = getSampleStyleSheet()
-    title = Paragraph("📊 Inventory Report", styles['Title'])
+    title = Paragraph("📊 Inventory Report", _TITLE_STYLE)
     elements.append(title)
 
     # Convert data to table format
     # Detect columns from first row
-    first = report_data[0]
     if hasattr(first, 'keys'):  # sqlite3.Row or dict
         cols = list(first.keys())
-        data = [cols] + [[str(r[c]) for c in cols] for r in report_data]
+        data = [cols, *([str(r[c]) for c in cols] for r in report_rows)]
     elif isinstance(first, dict):
         cols = list(first.keys())
-        data = [cols] + [[str(r.get(c, '')) for c in cols] for r in report_data]
+        data = [cols] + [[str(r.get(c, '')) for c in cols] for r in report_rows]
     else:  # tuple/list
         ncols = len(first)
         cols = [f"Col {i+1}" for i in range(ncols)]
-        data = [cols] + [list(map(str, r)) for r in report_data]
+        data = [cols] + [list(map(str, r)) for r in report_rows]
 
     # Build table
-    table = Table(data, hAlign='LEFT')
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0,0), (-1,0), colors.HexColor("#4CAF50")),
-        ('TEXTCOLOR', (0,0), (-1,0), colors.whitesmoke),
-        ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0,0), (-1,0), 12),
-        ('BACKGROUND', (0,1), (-1,-1), colors.beige),
-        ('GRID', (0,0), (-1,-1), 1, colors.black),
-    ]))
+    # Fixed column widths spare ReportLab from measuring every cell
+    table = Table(data, colWidths=[doc.width / len(cols)] * len(cols), hAlign='LEFT')
+    table.setStyle(_TABLE_STYLE)
     elements.append(table)
 
-    doc.build(elements)
-    buffer.seek(0)
+    try:
+        doc.build(elements)
+    except Exception:
+        pdf_file.close()
+        raise
+    pdf_file.seek(0)
 
-    # Return file for download
+    # Return file for download; send_file streams it in blocks, then closes it
     return send_file(
-        buffer,
+        pdf_file,
         as_attachment=True,
         download_name=f"inventory_report.pdf",
         mimetype="application/pdf"
@@ -344,4 +362,5 @@ def download_report():
 
 # Entry point for running the Flask app
 if __name__ == '__main__':
+    ensure_schema()  # Initialize DB when the app starts
     app.run(debug=True)
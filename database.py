@@ -1,28 +1,107 @@
 import sqlite3
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
 import os
+import queue
+import threading
+import time
 import uuid 
 
+try:
+    import fcntl
+except ImportError:  # Windows: workers are not serialized during ensure_schema()
+    fcntl = None
+
 DATABASE = 'inventory.db'
 
-def get_db():
-    """Connects to the specific database."""
-    conn = sqlite3.connect(DATABASE)
+# Seconds a cached read is kept in this process. Entries are checked against
+# the shared TableVersion counters on every read, so the TTL only bounds how
+# long unchanged rows are reused, never how long stale rows can be served.
+CACHE_TTL = 30
+
+# Per-connection settings; SQLite does not persist these in the file.
+CONNECTION_PRAGMAS = (
+    'PRAGMA foreign_keys = ON;',
+    'PRAGMA synchronous = NORMAL;',  # Safe with WAL, avoids an fsync per commit
+    'PRAGMA temp_store = MEMORY;',
+    'PRAGMA mmap_size = 268435456;',  # 256 MiB
+    'PRAGMA cache_size = -20000;',  # ~20 MB page cache
+    'PRAGMA busy_timeout = 30000;',  # Wait up to 30s for a concurrent writer
+    'PRAGMA wal_autocheckpoint = 1000;',  # Checkpoint every ~1000 WAL pages
+)
+
+# Prepared statements kept per connection (sqlite3 defaults to 128)
+STATEMENT_CACHE_SIZE = 256
+
+# Bump whenever init_db() changes the schema; stored as PRAGMA user_version
+SCHEMA_VERSION = 2
+
+# Idle connections kept open per process. Busier moments open extra
+# connections, which are closed again instead of being returned.
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+
+_pool = queue.LifoQueue(maxsize=POOL_SIZE)
+_pool_pid = os.getpid()
+
+def _connect():
+    """Opens and configures a new connection to the database."""
+    conn = sqlite3.connect(DATABASE, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
     conn.row_factory = sqlite3.Row  # Allows accessing columns by name
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
     return conn
 
+def acquire_connection():
+    """Takes an idle connection from the pool, or opens a new one."""
+    global _pool, _pool_pid
+    if _pool_pid != os.getpid():
+        # SQLite connections must not cross a fork; start a fresh pool
+        _pool = queue.LifoQueue(maxsize=POOL_SIZE)
+        _pool_pid = os.getpid()
+    try:
+        return _pool.get_nowait()
+    except queue.Empty:
+        return _connect()
+
+def release_connection(conn):
+    """Returns a connection to the pool, discarding any open transaction."""
+    if conn.in_transaction:
+        conn.rollback()
+    try:
+        _pool.put_nowait(conn)
+    except queue.Full:
+        conn.close()
+
+@contextmanager
+def get_db():
+    """
+    Checks out a pooled connection to the database.
+
+    Like using a sqlite3 connection in a with-block, the transaction is
+    committed on success and rolled back on error.
+    """
+    conn = acquire_connection()
+    try:
+        with conn:
+            yield conn
+    finally:
+        release_connection(conn)
+
 def init_db():
     """Initializes the database schema."""
     with get_db() as db:
-        # Enable foreign keys for integrity
-        db.execute('PRAGMA foreign_keys = ON;')
+        # WAL lets readers proceed while a writer commits; the setting is
+        # stored in the database file, so it only needs to be set once
+        db.execute('PRAGMA journal_mode = WAL;')
         
         # Products table
+        # WITHOUT ROWID clusters rows on the text key itself, so id lookups
+        # and FK checks walk one B-tree instead of a key index plus the table
         db.execute('''
             CREATE TABLE IF NOT EXISTS Product (
                 product_id TEXT PRIMARY KEY,
                 name TEXT UNIQUE NOT NULL
-            );
+            ) WITHOUT ROWID;
         ''')
         
         # Locations table (Warehouses)
@@ -30,7 +109,7 @@ def init_db():
             CREATE TABLE IF NOT EXISTS Location (
                 location_id TEXT PRIMARY KEY,
                 name TEXT UNIQUE NOT NULL
-            );
+            ) WITHOUT ROWID;
         ''')
         
         # Movements table
@@ -49,96 +128,298 @@ def init_db():
                 FOREIGN KEY (to_location) REFERENCES Location(location_id) ON DELETE NO ACTION
             );
         ''')
+        
+        # Indexes for the movement-history checks on delete, the report
+        # joins and the recent-movements listing
+        db.execute('CREATE INDEX IF NOT EXISTS idx_pm_product ON ProductMovement(product_id);')
+        db.execute('CREATE INDEX IF NOT EXISTS idx_pm_from ON ProductMovement(from_location);')
+        db.execute('CREATE INDEX IF NOT EXISTS idx_pm_to ON ProductMovement(to_location);')
+        db.execute('CREATE INDEX IF NOT EXISTS idx_pm_ts ON ProductMovement(timestamp DESC);')
+
+        # Change counters for the read cache, bumped by triggers on every write
+        # so each worker process can tell when its cached rows went stale
+        db.execute('''
+            CREATE TABLE IF NOT EXISTS TableVersion (
+                table_name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            ) WITHOUT ROWID;
+        ''')
+        for table in VERSIONED_TABLES:
+            db.execute(
+                "INSERT OR IGNORE INTO TableVersion (table_name, version) VALUES (?, 0)", (table,)
+            )
+            for event in ('INSERT', 'UPDATE', 'DELETE'):
+                db.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS trg_{table.lower()}_version_{event.lower()}
+                    AFTER {event} ON {table}
+                    BEGIN
+                        UPDATE TableVersion SET version = version + 1 WHERE table_name = '{table}';
+                    END;
+                ''')
+        db.commit()
+        
+        # Stock balance per product and location, kept current by triggers on
+        # ProductMovement so the inventory report doesn't re-aggregate history.
+        # Created and backfilled in one transaction so no movement is missed.
+        db.execute('BEGIN IMMEDIATE')
+        has_balances = db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'StockBalance'"
+        ).fetchone()
+        db.execute('''
+            CREATE TABLE IF NOT EXISTS StockBalance (
+                product_id TEXT NOT NULL,
+                location_id TEXT NOT NULL,
+                qty INTEGER NOT NULL,
+                PRIMARY KEY (product_id, location_id)
+            ) WITHOUT ROWID;
+        ''')
+        db.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_pm_stock_in
+            AFTER INSERT ON ProductMovement
+            WHEN NEW.to_location IS NOT NULL
+            BEGIN
+                INSERT INTO StockBalance (product_id, location_id, qty)
+                VALUES (NEW.product_id, NEW.to_location, NEW.qty)
+                ON CONFLICT (product_id, location_id) DO UPDATE SET qty = qty + excluded.qty;
+            END;
+        ''')
+        db.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_pm_stock_out
+            AFTER INSERT ON ProductMovement
+            WHEN NEW.from_location IS NOT NULL
+            BEGIN
+                INSERT INTO StockBalance (product_id, location_id, qty)
+                VALUES (NEW.product_id, NEW.from_location, -NEW.qty)
+                ON CONFLICT (product_id, location_id) DO UPDATE SET qty = qty + excluded.qty;
+            END;
+        ''')
+        if not has_balances:
+            # One-time backfill from the movements recorded before the table existed
+            db.execute('''
+                INSERT INTO StockBalance (product_id, location_id, qty)
+                SELECT product_id, location_id, SUM(change_qty)
+                FROM (
+                    SELECT product_id, to_location AS location_id, qty AS change_qty
+                    FROM ProductMovement WHERE to_location IS NOT NULL
+                    UNION ALL
+                    SELECT product_id, from_location AS location_id, -qty AS change_qty
+                    FROM ProductMovement WHERE from_location IS NOT NULL
+                )
+                GROUP BY product_id, location_id;
+            ''')
         db.commit()
 
 # --- Utility Data Functions ---
 
+PRODUCTS_QUERY = 'SELECT * FROM Product ORDER BY name'
+
+LOCATIONS_QUERY = 'SELECT * FROM Location ORDER BY name'
+
+RECENT_MOVEMENTS_QUERY = """
+SELECT 
+    m.movement_id, m.timestamp, m.qty,
+    p.name AS product_name,
+    l_from.name AS from_location_name,
+    l_to.name AS to_location_name
+FROM ProductMovement m
+JOIN Product p ON m.product_id = p.product_id
+LEFT JOIN Location l_from ON m.from_location = l_from.location_id
+LEFT JOIN Location l_to ON m.to_location = l_to.location_id
+ORDER BY m.timestamp DESC
+LIMIT 20;
+"""
+
+INVENTORY_REPORT_QUERY = """
+-- Balances are maintained by the StockBalance triggers in init_db()
+SELECT 
+    p.name AS product_name,
+    l.name AS location_name,
+    sb.qty AS final_qty
+FROM StockBalance sb
+JOIN Product p ON sb.product_id = p.product_id
+JOIN Location l ON sb.location_id = l.location_id
+WHERE 
+    sb.qty > 0
+ORDER BY 
+    p.name, l.name;
+"""
+
+# --- Read Cache ---
+
+# Tables whose writes are counted in TableVersion
+VERSIONED_TABLES = ('Product', 'Location', 'ProductMovement')
+
+# Cache key -> tables its query reads. Changing any of them drops the entry;
+# movement listings and the report also show product and location names.
+CACHE_TABLES = {
+    'products': ('Product',),
+    'locations': ('Location',),
+    'movements': ('ProductMovement', 'Product', 'Location'),
+    'report_data': ('ProductMovement', 'Product', 'Location'),
+}
+
+TABLE_VERSIONS_QUERY = 'SELECT table_name, version FROM TableVersion'
+
+_MISS = object()
+_cache = {}
+_cache_lock = threading.Lock()
+
+def _read_versions(conn):
+    """Reads the committed change counter of every versioned table."""
+    return dict(conn.execute(TABLE_VERSIONS_QUERY).fetchall())
+
+def _versions(key, table_versions):
+    """Picks the versions of the tables behind a cache key."""
+    return tuple(table_versions[table] for table in CACHE_TABLES[key])
+
+def _cache_get(key, versions):
+    """Returns the cached rows for key, or _MISS if absent, expired or stale."""
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is None:
+            return _MISS
+        cached_versions, expires_at, rows = entry
+        if cached_versions != versions or expires_at < time.monotonic():
+            del _cache[key]
+            return _MISS
+        return rows
+
+def _cache_put(key, versions, rows):
+    """
+    Stores rows read after key's tables were seen at the given versions.
+
+    The versions are read before the query, so a write committed in between
+    only makes the entry look older than it is and it is simply re-read.
+    """
+    with _cache_lock:
+        _cache[key] = (versions, time.monotonic() + CACHE_TTL, rows)
+
+def invalidate(*tables):
+    """
+    Drops this process's cached reads that depend on any of the given tables.
+
+    Writes already bump TableVersion, which every process checks before
+    reusing a cached read; this just frees the stale entries straight away.
+    """
+    with _cache_lock:
+        for key in [k for k in _cache if set(CACHE_TABLES[k]) & set(tables)]:
+            del _cache[key]
+
+def invalidate_catalog_cache():
+    """Drops all cached reads. Call after committing any data change."""
+    invalidate(*VERSIONED_TABLES)
+
+def _connection(db=None):
+    """Uses the caller's connection when given, otherwise a pooled one."""
+    return nullcontext(db) if db is not None else get_db()
+
+def _load_cached(key, query):
+    """Runs query through the read cache under the given key."""
+    with get_db() as conn:
+        versions = _versions(key, _read_versions(conn))
+        rows = _cache_get(key, versions)
+        if rows is _MISS:
+            rows = conn.execute(query).fetchall()
+            _cache_put(key, versions, rows)
+    return rows
+
 def get_all_products():
     """Fetches all products."""
-    with get_db() as db:
-        return db.execute('SELECT * FROM Product ORDER BY name').fetchall()
+    return _load_cached('products', PRODUCTS_QUERY)
 
 def get_all_locations():
     """Fetches all locations."""
-    with get_db() as db:
-        return db.execute('SELECT * FROM Location ORDER BY name').fetchall()
+    return _load_cached('locations', LOCATIONS_QUERY)
 
 def get_recent_movements():
     """Fetches the 20 most recent movements."""
-    with get_db() as db:
-        query = """
-        SELECT 
-            m.movement_id, m.timestamp, m.qty,
-            p.name AS product_name,
-            l_from.name AS from_location_name,
-            l_to.name AS to_location_name
-        FROM ProductMovement m
-        JOIN Product p ON m.product_id = p.product_id
-        LEFT JOIN Location l_from ON m.from_location = l_from.location_id
-        LEFT JOIN Location l_to ON m.to_location = l_to.location_id
-        ORDER BY m.timestamp DESC
-        LIMIT 20;
-        """
-        return db.execute(query).fetchall()
+    return _load_cached('movements', RECENT_MOVEMENTS_QUERY)
 
 def get_inventory_report():
     """
     Calculates the current stock balance for all products in all locations.
     """
+    return _load_cached('report_data', INVENTORY_REPORT_QUERY)
+
+def get_inventory_report_iter():
+    """
+    Yields the inventory report rows straight from the cursor, for callers
+    that consume them once (e.g. PDF export) and needn't hold a full copy.
+    """
     with get_db() as db:
-        movement_summary_query = """
-        WITH MovementSummary AS (
-            -- Stock In (To Location)
-            SELECT 
-                to_location AS location_id,
-                product_id,
-                qty AS change_qty
-            FROM ProductMovement
-            WHERE to_location IS NOT NULL
-            
-            UNION ALL
-            
-            -- Stock Out (From Location)
-            SELECT 
-                from_location AS location_id,
-                product_id,
-                qty * -1 AS change_qty -- Subtract stock by making quantity negative
-            FROM ProductMovement
-            WHERE from_location IS NOT NULL
-        )
-        
-        -- Final Report Query: Group and sum the changes
-        SELECT 
-            p.name AS product_name,
-            l.name AS location_name,
-            SUM(ms.change_qty) AS final_qty
-        FROM MovementSummary ms
-        JOIN Product p ON ms.product_id = p.product_id
-        JOIN Location l ON ms.location_id = l.location_id
-        GROUP BY 
-            p.name, l.name
-        HAVING 
-            final_qty > 0
-        ORDER BY 
-            p.name, l.name;
-        """
-        
-        report = db.execute(movement_summary_query).fetchall()
-        return report
+        yield from db.execute(INVENTORY_REPORT_QUERY)
+
+# Bundle key (also its cache key) -> query
+_BUNDLE_QUERIES = {
+    'products': PRODUCTS_QUERY,
+    'locations': LOCATIONS_QUERY,
+    'movements': RECENT_MOVEMENTS_QUERY,
+    'report_data': INVENTORY_REPORT_QUERY,
+}
+
+def load_dashboard_bundle(include_report=False, db=None):
+    """
+    Fetches everything a page of index.html needs over a single connection.
+
+    Returns a dict with 'products', 'locations' and 'movements' (plus
+    'report_data' when include_report is True), ready to be passed to
+    render_template as keyword arguments. Cached results that are still
+    current are reused and only the remaining queries hit the database.
+    Runs on db when given (e.g. the request's connection), otherwise on a
+    pooled one.
+    """
+    bundle = {}
+    with _connection(db) as conn:
+        table_versions = _read_versions(conn)
+        for key, query in _BUNDLE_QUERIES.items():
+            if key == 'report_data' and not include_report:
+                continue
+            versions = _versions(key, table_versions)
+            rows = _cache_get(key, versions)
+            if rows is _MISS:
+                rows = conn.execute(query).fetchall()
+                _cache_put(key, versions, rows)
+            bundle[key] = rows
+    return bundle
+
+# --- Write Statements ---
+
+# Shared so every caller passes the identical string and hits the
+# connection's statement cache instead of re-preparing the SQL.
+
+# Local time in the same text layout the sqlite3 datetime adapter produced
+# for existing rows, so ORDER BY timestamp stays chronological
+CURRENT_TIMESTAMP_SQL = "strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')"
+
+# Random 128-bit id as 32 lowercase hex chars, generated by SQLite; the same
+# shape as uuid4().hex so ids from either source look alike
+NEW_ID_SQL = "lower(hex(randomblob(16)))"
+
+INSERT_PRODUCT_SQL = f"INSERT INTO Product (product_id, name) VALUES ({NEW_ID_SQL}, ?) RETURNING product_id"
+UPDATE_PRODUCT_SQL = "UPDATE Product SET name = ? WHERE product_id = ? RETURNING name"
+DELETE_PRODUCT_SQL = "DELETE FROM Product WHERE product_id = ? RETURNING name"
+
+INSERT_LOCATION_SQL = f"INSERT INTO Location (location_id, name) VALUES ({NEW_ID_SQL}, ?) RETURNING location_id"
+UPDATE_LOCATION_SQL = "UPDATE Location SET name = ? WHERE location_id = ? RETURNING name"
+DELETE_LOCATION_SQL = "DELETE FROM Location WHERE location_id = ? RETURNING name"
+
+INSERT_MOVEMENT_SQL = f"INSERT INTO ProductMovement (timestamp, from_location, to_location, product_id, qty) VALUES ({CURRENT_TIMESTAMP_SQL}, ?, ?, ?, ?)"
 
 # --- Update Functions ---
 
 def update_product(product_id, new_name):
     """Updates the name of an existing product."""
     with get_db() as db:
-        db.execute("UPDATE Product SET name = ? WHERE product_id = ?", (new_name, product_id))
+        db.execute(UPDATE_PRODUCT_SQL, (new_name, product_id))
         db.commit()
+    invalidate('Product')
 
 def update_location(location_id, new_name):
     """Updates the name of an existing location."""
     with get_db() as db:
-        db.execute("UPDATE Location SET name = ? WHERE location_id = ?", (new_name, location_id))
+        db.execute(UPDATE_LOCATION_SQL, (new_name, location_id))
         db.commit()
+    invalidate('Location')
 
 # --- Delete Functions ---
 
@@ -146,20 +427,41 @@ def delete_product(product_id):
     """Deletes a product by ID. Fails if movements reference it."""
     with get_db() as db:
         # Fails if any movement uses this product_id due to FOREIGN KEY constraint
-        db.execute("DELETE FROM Product WHERE product_id = ?", (product_id,))
+        db.execute(DELETE_PRODUCT_SQL, (product_id,))
         db.commit()
+    invalidate('Product')
 
 def delete_location(location_id):
     """Deletes a location by ID. Fails if movements reference it."""
     with get_db() as db:
         # Fails if any movement uses this location_id due to FOREIGN KEY constraint
-        db.execute("DELETE FROM Location WHERE location_id = ?", (location_id,))
+        db.execute(DELETE_LOCATION_SQL, (location_id,))
+        db.commit()
+    invalidate('Location')
+
+# --- Insert Functions ---
+
+def bulk_add_movements(rows):
+    """
+    Records many movements in one transaction.
+
+    Each row is a (from_location, to_location, product_id, qty) tuple and
+    is stamped with the current local time by SQLite. The whole batch is
+    committed, or rolled back, together.
+    """
+    with get_db() as db:
+        db.execute('BEGIN IMMEDIATE')
+        db.executemany(INSERT_MOVEMENT_SQL, rows)
         db.commit()
+    invalidate('ProductMovement')
 
 
 def populate_initial_data():
     """Populates required test data if tables are empty."""
     with get_db() as db:
+        # Take the write lock before checking, so two workers can't both seed
+        db.execute('BEGIN IMMEDIATE')
+        
         # Check if Product table is empty
         if db.execute("SELECT COUNT(*) FROM Product").fetchone()[0] > 0:
             return  # Data already exists
@@ -168,57 +470,66 @@ def populate_initial_data():
 
         # Products (Laptop, Mouse, Keyboard)
         # Using simple IDs for initial data that won't be deleted for foreign key stability
-        db.execute("INSERT INTO Product (product_id, name) VALUES (?, ?)", ('p1', 'Laptop'))
-        db.execute("INSERT INTO Product (product_id, name) VALUES (?, ?)", ('p2', 'Mouse'))
-        db.execute("INSERT INTO Product (product_id, name) VALUES (?, ?)", ('p3', 'Keyboard'))
-        
-        # Retrieve the generated IDs for movements
-        products_map = {row['name']: row['product_id'] for row in db.execute("SELECT product_id, name FROM Product").fetchall()}
+        db.executemany(
+            "INSERT INTO Product (product_id, name) VALUES (?, ?)",
+            [('p1', 'Laptop'), ('p2', 'Mouse'), ('p3', 'Keyboard')]
+        )
         
         # Locations (Location X, Y, Z)
-        db.execute("INSERT INTO Location (location_id, name) VALUES (?, ?)", ('l1', 'Location X'))
-        db.execute("INSERT INTO Location (location_id, name) VALUES (?, ?)", ('l2', 'Location Y'))
-        db.execute("INSERT INTO Location (location_id, name) VALUES (?, ?)", ('l3', 'Location Z'))
-
-        locations_map = {row['name']: row['location_id'] for row in db.execute("SELECT location_id, name FROM Location").fetchall()}
-
-        p1, p2, p3 = products_map['Laptop'], products_map['Mouse'], products_map['Keyboard']
-        l1, l2, l3 = locations_map['Location X'], locations_map['Location Y'], locations_map['Location Z']
+        db.executemany(
+            "INSERT INTO Location (location_id, name) VALUES (?, ?)",
+            [('l1', 'Location X'), ('l2', 'Location Y'), ('l3', 'Location Z')]
+        )
 
-        # Movements (20 records) - Timestamps are approximated
-        now = datetime.now()
-        
-        def insert_movement(product_id, from_id, to_id, qty, offset_seconds):
-            ts = now.timestamp() - offset_seconds
-            db.execute("INSERT INTO ProductMovement (timestamp, from_location, to_location, product_id, qty) VALUES (?, ?, ?, ?, ?)",
-                       (datetime.fromtimestamp(ts), from_id, to_id, product_id, qty))
-
-        # 1. Initial Stock-In (3)
-        insert_movement(p1, None, l1, 50, 100) # Laptop to Location X
-        insert_movement(p2, None, l1, 100, 90) # Mouse to Location X
-        insert_movement(p3, None, l2, 15, 80)  # Keyboard to Location Y
-
-        # 2. Transfer Laptop (p1) from Location X (l1) to Location Y (l2) (5 movements)
-        for i in range(5):
-             insert_movement(p1, l1, l2, 5, 70 - i)
-        
-        # 3. Transfer Mouse (p2) from Location X (l1) to Location Z (l3) (5 movements)
-        for i in range(5):
-             insert_movement(p2, l1, l3, 10, 60 - i)
-        
-        # 4. Stock-Out/Sale Keyboard (p3) from Location Y (l2) (5 movements)
-        for i in range(5):
-             insert_movement(p3, l2, None, 2, 50 - i)
+        # Movements (20 records) as (product, from, to, qty, seconds ago)
+        movements = [
+            # 1. Initial Stock-In (3)
+            ('p1', None, 'l1', 50, 100),  # Laptop to Location X
+            ('p2', None, 'l1', 100, 90),  # Mouse to Location X
+            ('p3', None, 'l2', 15, 80),   # Keyboard to Location Y
+            # 2. Transfer Laptop (p1) from Location X (l1) to Location Y (l2) (5 movements)
+            *[('p1', 'l1', 'l2', 5, 70 - i) for i in range(5)],
+            # 3. Transfer Mouse (p2) from Location X (l1) to Location Z (l3) (5 movements)
+            *[('p2', 'l1', 'l3', 10, 60 - i) for i in range(5)],
+            # 4. Stock-Out/Sale Keyboard (p3) from Location Y (l2) (5 movements)
+            *[('p3', 'l2', None, 2, 50 - i) for i in range(5)],
+            # 5. Additional Stock-In (2 movements, bringing total to 20 records)
+            ('p2', None, 'l1', 50, 40),   # Mouse to Location X
+            ('p1', None, 'l1', 10, 30),   # Laptop to Location X
+        ]
 
-        # 5. Additional Stock-In (2 movements, bringing total to 20 records)
-        insert_movement(p2, None, l1, 50, 40) # Mouse to Location X
-        insert_movement(p1, None, l1, 10, 30) # Laptop to Location X
+        # Timestamps are approximated, in the text layout used for all movements
+        now = datetime.now().timestamp()
+        db.executemany(
+            "INSERT INTO ProductMovement (timestamp, from_location, to_location, product_id, qty) VALUES (?, ?, ?, ?, ?)",
+            [
+                (datetime.fromtimestamp(now - offset).isoformat(' '), from_id, to_id, product_id, qty)
+                for product_id, from_id, to_id, qty, offset in movements
+            ]
+        )
         
         db.commit()
         print("--- Initial data population complete ---")
 
 
-# Initialize database on module load
-if not os.path.exists(DATABASE) or os.path.getsize(DATABASE) == 0:
-    init_db()
-    populate_initial_data()
+def ensure_schema():
+    """
+    Creates or upgrades the schema unless the database is already current.
+
+    Workers starting together take turns on a sibling lock file, so only
+    the first one runs init_db(); the rest just read PRAGMA user_version.
+    Test data is seeded only into a brand-new database.
+    """
+    with open(DATABASE + '.lock', 'w') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)  # Released when the file closes
+        with get_db() as db:
+            if db.execute('PRAGMA user_version').fetchone()[0] >= SCHEMA_VERSION:
+                return
+            is_new = db.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()[0] == 0
+
+        init_db()
+        if is_new:
+            populate_initial_data()
+        with get_db() as db:
+            db.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')